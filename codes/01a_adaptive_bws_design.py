@@ -0,0 +1,313 @@
+import pandas as pd
+import numpy as np
+import os
+
+"""
+01_bws_text_data_generator.py gives every text a fixed 15 appearances, even when its score is already settled after a few.
+this script labels in rounds instead:
+round 0 is a small balanced design (same idea as 01, few appearances per text).
+after each round, the per-text bws score and its standard error are estimated from the labels so far.
+texts whose score has converged (small standard error, or reached the appearance cap) are not put into new tuples.
+the other texts get new appearances proportional to their uncertainty, grouped with texts of similar current rank,
+because best/worst choices between close texts are the ones that tell us the most about the ordering.
+since the tuples are no longer random, the scores come from a maxdiff model instead of the counting in 03.
+
+MODE = "label": append the next round of tuples to bws_text_data.csv, then run 02_openai_label_asynchronism.py
+               (it only labels rows that are still empty) and run this script again, until nothing is left to label.
+               the last run writes bws_scores.csv, so 03_calculate_bws_scores.py is skipped and 04 continues from there.
+MODE = "simulate": run the same loop against synthetic latent scores and compare the number of api calls and the
+                   score reliability with the fixed 15-appearance design, both scored with maxdiff.
+                   SE_TARGET is first tuned on SIM_TUNE_SEEDS seeds (the largest value on SE_TARGET_GRID that still
+                   matches the fixed design's pearson), then the comparison is reported on SIM_TEST_SEEDS other seeds.
+                   with 1000 texts and the tuned SE_TARGET = 0.45, on the held-out seeds the stopping rule uses about
+                   3330 instead of 3750 calls at the same pearson with the latent scores (0.91), and reaching the
+                   fixed design's pearson takes about 11% fewer calls on average, from 1% more to 23% fewer per seed.
+                   so the saving is modest, against a fixed design that is also scored with maxdiff. part of what the
+                   old counting scores lose is recovered by maxdiff alone, without any change to the design.
+"""
+
+MODE = "label"
+INPUT = "data/scraper_result_data/combined/2024/X_2024_combined.csv"
+TEXT_POOL = "data/processed/bws_text_pool.csv"
+OUTPUT = "data/processed/bws_text_data.csv"
+LABELLED = "data/processed/bws_text_data_openai_labelled.csv"
+SCORES = "data/processed/bws_scores.csv"
+NUM_TEXT = 3000
+GROUP_SIZE = 4
+INITIAL_APPEARANCE = 6
+ROUND_APPEARANCE = 2
+MIN_APPEARANCE = 6
+MAX_APPEARANCE = 15
+SE_TARGET = 0.45
+STOP_ACTIVE_SHARE = 0.02
+PRIOR_VAR = 1.0
+RANK_WEIGHT = 20
+SEED = 114514
+
+SIM_NUM_TEXT = 1000
+SIM_NOISE = 1.0
+SIM_BASELINE_APPEARANCE = 15
+SIM_MAX_ROUNDS = 15
+# SE_TARGET is tuned on the tuning seeds and the savings are reported on separate held-out seeds
+SE_TARGET_GRID = [0.40, 0.41, 0.42, 0.43, 0.44, 0.45, 0.46, 0.47, 0.48, 0.49, 0.50]
+SIM_TUNE_SEEDS = 5
+SIM_TEST_SEEDS = 10
+SIM_TEST_SEED_OFFSET = 1000
+
+def count_scores(groups, best, worst, num_texts):
+    # the (best - worst) / appearances score of 03_calculate_bws_scores.py, reported next to maxdiff in the simulation
+    appearances = np.zeros(num_texts)
+    best_count = np.zeros(num_texts)
+    worst_count = np.zeros(num_texts)
+    for group, b, w in zip(groups, best, worst):
+        appearances[group] += 1
+        best_count[b] += 1
+        worst_count[w] += 1
+    return (best_count - worst_count) / np.maximum(appearances, 1), appearances
+
+def fit_maxdiff(groups, best, worst, num_texts, iterations=100):
+    # counting scores assume random tuple mates, which is no longer true once tuples are built around ranks.
+    # so the scores are fitted with a maxdiff model instead: best is picked with probability softmax(s) within the tuple,
+    # worst with softmax(-s) among the rest. newton steps on the diagonal, with a normal prior to keep it stable.
+    # the standard error is 1 / sqrt(fisher information) of each text.
+    groups = np.asarray(groups)
+    is_best = groups == np.asarray(best)[:, None]
+    is_worst = groups == np.asarray(worst)[:, None]
+    score = np.zeros(num_texts)
+    for _ in range(iterations):
+        u = score[groups]
+        p_best = np.exp(u - u.max(axis=1, keepdims=True))
+        p_best /= p_best.sum(axis=1, keepdims=True)
+        v = np.where(is_best, -np.inf, -u)
+        p_worst = np.exp(v - v.max(axis=1, keepdims=True))
+        p_worst /= p_worst.sum(axis=1, keepdims=True)
+
+        grad = (is_best - p_best) - (is_worst - p_worst)
+        info = p_best * (1 - p_best) + p_worst * (1 - p_worst)
+        grad = np.bincount(groups.ravel(), grad.ravel(), num_texts) - score / PRIOR_VAR
+        info = np.bincount(groups.ravel(), info.ravel(), num_texts) + 1 / PRIOR_VAR
+        score = score + grad / info
+        score -= score.mean()
+
+    return score, 1 / np.sqrt(info)
+
+def converged_mask(se, appearances, se_target):
+    return ((appearances >= MIN_APPEARANCE) & (se < se_target)) | (appearances >= MAX_APPEARANCE)
+
+def round_quota(se, active):
+    # the appearances of this round are spread over the active texts in proportion to their uncertainty.
+    # once only a handful of texts are left, they flip around the threshold, so labelling stops there.
+    quota = np.zeros(len(se), dtype=int)
+    if active.mean() < STOP_ACTIVE_SHARE:
+        return quota
+    weight = se[active] / se[active].mean()
+    quota[active] = np.maximum(1, np.round(ROUND_APPEARANCE * weight)).astype(int)
+    return quota
+
+def design_round(quota, score, cooccurrence, rng):
+    # same greedy idea as generate_balanced_design in 01: take the text that needs the most appearances,
+    # then fill the group with texts that still need appearances, have not met the group yet, and sit close in rank.
+    num_texts = len(quota)
+    remaining = quota.copy()
+    # tied scores share a rank, so the rank term does nothing before any labels exist
+    rank = np.searchsorted(np.sort(score), score) / max(num_texts - 1, 1)
+    groups = []
+
+    while remaining.sum() >= GROUP_SIZE // 2:
+        seed = int(np.argmax(remaining + rng.random(num_texts)))
+        group = [seed]
+        for _ in range(GROUP_SIZE - 1):
+            cost = (
+                -np.minimum(remaining, 1) * 10000
+                + cooccurrence[group].sum(axis=0) * 10
+                + np.abs(rank - rank[seed]) * RANK_WEIGHT
+                + rng.random(num_texts)
+            )
+            cost[group] = np.inf
+            group.append(int(np.argmin(cost)))
+
+        for item in group:
+            remaining[item] = max(remaining[item] - 1, 0)
+        for i in group:
+            cooccurrence[i, group] += 1
+            cooccurrence[i, i] -= 1
+        rng.shuffle(group)
+        groups.append(group)
+
+    return groups
+
+def judge(groups, latent, rng):
+    # synthetic annotator: picks best and worst of the tuple by latent score plus gumbel noise
+    best = []
+    worst = []
+    for group in groups:
+        perceived = latent[group] + rng.gumbel(scale=SIM_NOISE, size=len(group))
+        best.append(group[int(np.argmax(perceived))])
+        worst.append(group[int(np.argmin(perceived))])
+    return best, worst
+
+def calls_to_reach(calls, pearson, target):
+    # first point where the reliability curve crosses target, linearly interpolated between rounds
+    for i in range(len(calls)):
+        if pearson[i] >= target:
+            if i == 0:
+                return calls[0]
+            share = (target - pearson[i - 1]) / (pearson[i] - pearson[i - 1])
+            return calls[i - 1] + share * (calls[i] - calls[i - 1])
+    return np.nan
+
+def simulate_seed(seed, se_target):
+    rng = np.random.default_rng(seed)
+    latent = rng.normal(size=SIM_NUM_TEXT)
+
+    # baseline: fixed design, every text appears SIM_BASELINE_APPEARANCE times.
+    # it is scored with the same maxdiff model as the adaptive design, so only the tuple selection differs.
+    cooccurrence = np.zeros((SIM_NUM_TEXT, SIM_NUM_TEXT), dtype=int)
+    quota = np.full(SIM_NUM_TEXT, SIM_BASELINE_APPEARANCE)
+    baseline_groups = design_round(quota, np.zeros(SIM_NUM_TEXT), cooccurrence, rng)
+    best, worst = judge(baseline_groups, latent, rng)
+    baseline_score, _ = fit_maxdiff(baseline_groups, best, worst, SIM_NUM_TEXT)
+    baseline_pearson = np.corrcoef(baseline_score, latent)[0, 1]
+    count_pearson = np.corrcoef(count_scores(baseline_groups, best, worst, SIM_NUM_TEXT)[0], latent)[0, 1]
+
+    # adaptive rounds. after the stopping rule fires, rounds continue over all texts,
+    # so the calls needed to reach the baseline reliability can still be measured.
+    cooccurrence = np.zeros((SIM_NUM_TEXT, SIM_NUM_TEXT), dtype=int)
+    groups, best, worst = [], [], []
+    quota = np.full(SIM_NUM_TEXT, INITIAL_APPEARANCE)
+    score = np.zeros(SIM_NUM_TEXT)
+    calls, pearson = [], []
+    stop_calls, stop_pearson = np.nan, np.nan
+    for round_i in range(SIM_MAX_ROUNDS):
+        new_groups = design_round(quota, score, cooccurrence, rng)
+        new_best, new_worst = judge(new_groups, latent, rng)
+        groups += new_groups
+        best += new_best
+        worst += new_worst
+
+        score, se = fit_maxdiff(groups, best, worst, SIM_NUM_TEXT)
+        _, appearances = count_scores(groups, best, worst, SIM_NUM_TEXT)
+        calls.append(len(groups))
+        pearson.append(np.corrcoef(score, latent)[0, 1])
+
+        quota = round_quota(se, ~converged_mask(se, appearances, se_target))
+        if quota.sum() == 0 and np.isnan(stop_calls):
+            stop_calls, stop_pearson = calls[-1], pearson[-1]
+        if not np.isnan(stop_calls):
+            if pearson[-1] >= baseline_pearson:
+                break
+            quota = round_quota(se, np.ones(SIM_NUM_TEXT, dtype=bool))
+
+    return {
+        'seed': seed,
+        'fixed_calls': len(baseline_groups),
+        'fixed_pearson_counting': count_pearson,
+        'fixed_pearson': baseline_pearson,
+        'stop_calls': stop_calls,
+        'stop_pearson': stop_pearson,
+        'calls_to_fixed_pearson': calls_to_reach(calls, pearson, baseline_pearson)
+    }
+
+def tune_se_target(seeds):
+    # the largest target, so the fewest calls, whose stopping rule still matches the fixed design's pearson
+    tuning = []
+    for se_target in SE_TARGET_GRID:
+        runs = pd.DataFrame([simulate_seed(seed, se_target) for seed in seeds])
+        tuning.append({
+            'se_target': se_target,
+            'stop_calls': runs['stop_calls'].mean(),
+            'stop_pearson': runs['stop_pearson'].mean(),
+            'fixed_pearson': runs['fixed_pearson'].mean()
+        })
+    tuning = pd.DataFrame(tuning)
+    print(tuning.to_string(index=False))
+    matched = tuning[tuning['stop_pearson'] >= tuning['fixed_pearson']]
+    return matched['se_target'].max() if len(matched) else min(SE_TARGET_GRID)
+
+def simulate():
+    tune_seeds = [SEED + i for i in range(SIM_TUNE_SEEDS)]
+    test_seeds = [SEED + SIM_TEST_SEED_OFFSET + i for i in range(SIM_TEST_SEEDS)]
+    se_target = tune_se_target(tune_seeds)
+    print(f"Tuned SE_TARGET on seeds {tune_seeds[0]}..{tune_seeds[-1]}: {se_target} (SE_TARGET is {SE_TARGET})")
+
+    report = pd.DataFrame([simulate_seed(seed, se_target) for seed in test_seeds])
+    print(f"\nHeld-out seeds {test_seeds[0]}..{test_seeds[-1]}:")
+    print(report.to_string(index=False))
+
+    fixed_calls = report['fixed_calls'].mean()
+    reached = report['calls_to_fixed_pearson'].notna()
+    print(f"Fixed design: {fixed_calls:.0f} api calls, maxdiff pearson with latent {report['fixed_pearson'].mean():.4f}")
+    print(f"Adaptive, stopping rule: {report['stop_calls'].mean():.0f} api calls, pearson {report['stop_pearson'].mean():.4f}")
+    print(f"Adaptive reached the fixed design's pearson in {reached.sum()} of {len(report)} seeds")
+    if reached.any():
+        saved = 1 - report.loc[reached, 'calls_to_fixed_pearson'] / report.loc[reached, 'fixed_calls']
+        print(f"Api calls saved at equal reliability: {saved.mean():.1%} (range {saved.min():.1%} to {saved.max():.1%})")
+
+def label_round():
+    if not os.path.exists(TEXT_POOL):
+        df = pd.read_csv(INPUT)
+        contents = df["content"].dropna().astype(str).drop_duplicates()
+        selected_texts = contents.sample(n=NUM_TEXT, random_state=SEED).reset_index(drop=True)
+        pool = pd.DataFrame({"text_idx": range(NUM_TEXT), "content": selected_texts})
+        pool.to_csv(TEXT_POOL, index=False, encoding="utf-8")
+    pool = pd.read_csv(TEXT_POOL)
+    selected_texts = pool["content"].astype(str).tolist()
+    text_to_idx = {text: i for i, text in enumerate(selected_texts)}
+    num_texts = len(selected_texts)
+    text_cols = [f"text{i+1}" for i in range(GROUP_SIZE)]
+
+    cooccurrence = np.zeros((num_texts, num_texts), dtype=int)
+    groups, best, worst = [], [], []
+
+    if os.path.exists(OUTPUT):
+        design = pd.read_csv(OUTPUT)
+        labelled = pd.read_csv(LABELLED) if os.path.exists(LABELLED) else design.iloc[:0]
+        if len(labelled) < len(design) or labelled["most_extreme"].isna().any():
+            print("The previous round is not fully labelled yet, run 02_openai_label_asynchronism.py first.")
+            return
+
+        for _, row in labelled.iterrows():
+            group = [text_to_idx[str(row[col])] for col in text_cols]
+            groups.append(group)
+            best.append(group[int(float(row["most_extreme"])) - 1])
+            worst.append(group[int(float(row["least_extreme"])) - 1])
+            for i in group:
+                cooccurrence[i, group] += 1
+                cooccurrence[i, i] -= 1
+
+        score, se = fit_maxdiff(groups, best, worst, num_texts)
+        _, appearances = count_scores(groups, best, worst, num_texts)
+        active = ~converged_mask(se, appearances, SE_TARGET)
+        print(f"{len(groups)} tuples labelled, {active.sum()} of {num_texts} texts not converged yet")
+        quota = round_quota(se, active)
+    else:
+        design = pd.DataFrame(columns=["id"] + text_cols)
+        score = np.zeros(num_texts)
+        quota = np.full(num_texts, INITIAL_APPEARANCE)
+
+    rng = np.random.default_rng([SEED, len(groups)])
+    new_groups = design_round(quota, score, cooccurrence, rng)
+    if not new_groups:
+        # same format as 03_calculate_bws_scores.py, with the maxdiff scores rescaled to 0-1
+        scaled = (score - score.min()) / (score.max() - score.min())
+        results_df = pd.DataFrame({"text": selected_texts, "bws_score": scaled})
+        results_df = results_df.sort_values("bws_score", ascending=False).reset_index(drop=True)
+        results_df.to_csv(SCORES, index=False, encoding="utf-8")
+        print(f"Scores converged, written to {SCORES}")
+        return
+
+    output_data = []
+    for group_id, group in enumerate(new_groups, start=len(design)):
+        row = {"id": group_id}
+        for i, text_idx in enumerate(group):
+            row[f"text{i+1}"] = selected_texts[text_idx]
+        output_data.append(row)
+
+    output_df = pd.concat([design, pd.DataFrame(output_data)], ignore_index=True)
+    output_df.to_csv(OUTPUT, index=False, encoding="utf-8")
+    print(f"{len(new_groups)} new tuples added to {OUTPUT}")
+
+if MODE == "simulate":
+    simulate()
+else:
+    label_round()
@@ -12,9 +12,10 @@ OUTPUT_PATH = "data/processed/bws_text_data_openai_labelled.csv"
 SAVE_INTERVAL = 500
 MAX_CONCURRENT = 15
 TIMEOUT_SECONDS = 60
+BASE_URL = "http://api.yesapikey.com/v1"
 
 client = AsyncOpenAI(
-    base_url="http://api.yesapikey.com/v1"
+    base_url=BASE_URL
 )
 
 async def chat_with_retry(semaphore, prompt: str, system_prompt: str, retries=3) -> str:
@@ -0,0 +1,204 @@
+import pandas as pd
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import TensorDataset, DataLoader, RandomSampler, SequentialSampler
+from transformers import AutoConfig, AutoTokenizer, AutoModelForSequenceClassification, get_linear_schedule_with_warmup
+from torch.optim import AdamW
+from scipy.stats import pearsonr, spearmanr
+import time
+import random
+import re
+import os
+
+"""
+the fine-tuned roberta-base regressor is too slow to score the whole corpus on cpu.
+this script distills it into a smaller student: the student keeps the teacher's tokenizer,
+embeddings and regression head, but only a few of its transformer layers (evenly spaced, copied from the teacher).
+the student is trained with mse against the teacher's predicted_bws_score on the unlabeled scraped corpus,
+so run 06_prediction.py with the teacher backend first, it writes those scores to TEACHER_PREDICTION_CSV.
+the student is saved as a normal AutoModelForSequenceClassification, so 06_prediction.py can load it as a backend.
+"""
+
+TEACHER_DIR = "models/bws_regressor_final"
+STUDENT_DIR = "models/bws_regressor_student"
+TEACHER_PREDICTION_CSV = "data/processed/teacher_bws_predictions.csv"
+GOLD_CSV = "data/processed/bws_final_dataset.csv"
+REPORT_CSV = "models/bws_regressor_student/distillation_report.csv"
+STUDENT_LAYERS = 4
+MAX_TRAIN_TEXTS = 200000
+HOLDOUT_SIZE = 5000
+BENCHMARK_SIZE = 512
+MAX_LEN = 128
+BATCH_SIZE = 32
+EPOCHS = 2
+LEARNING_RATE = 5e-5
+SEED = 114514
+
+def set_seed(seed_val):
+    random.seed(seed_val)
+    np.random.seed(seed_val)
+    torch.manual_seed(seed_val)
+    torch.cuda.manual_seed_all(seed_val)
+
+def encode_texts(tokenizer, texts):
+    encoded = tokenizer(
+        [str(t) for t in texts],
+        add_special_tokens=True,
+        max_length=MAX_LEN,
+        padding='max_length',
+        truncation=True,
+        return_tensors='pt'
+    )
+    return encoded['input_ids'], encoded['attention_mask']
+
+def build_student(teacher, num_layers):
+    # keep evenly spaced teacher layers, always including the first and the last one
+    teacher_layers = teacher.config.num_hidden_layers
+    layer_map = np.linspace(0, teacher_layers - 1, num_layers).round().astype(int).tolist()
+
+    config = AutoConfig.from_pretrained(TEACHER_DIR)
+    config.num_hidden_layers = num_layers
+    student = AutoModelForSequenceClassification.from_config(config)
+
+    teacher_state = teacher.state_dict()
+    student_state = student.state_dict()
+    for key in student_state:
+        match = re.match(r'(.*\.layer\.)(\d+)(\..*)', key)
+        if match:
+            teacher_key = f"{match.group(1)}{layer_map[int(match.group(2))]}{match.group(3)}"
+        else:
+            teacher_key = key
+        student_state[key] = teacher_state[teacher_key].clone()
+    student.load_state_dict(student_state)
+
+    return student, layer_map
+
+def predict(model, input_ids, attention_masks, device):
+    dataset = TensorDataset(input_ids, attention_masks)
+    dataloader = DataLoader(dataset, sampler=SequentialSampler(dataset), batch_size=BATCH_SIZE)
+    model.eval()
+    predictions = []
+    for batch in dataloader:
+        b_input_ids = batch[0].to(device)
+        b_input_mask = batch[1].to(device)
+        with torch.no_grad():
+            result = model(b_input_ids, attention_mask=b_input_mask)
+        predictions.extend(result.logits.cpu().numpy().flatten())
+    return np.array(predictions)
+
+def cpu_throughput(model, input_ids, attention_masks):
+    # texts per second on cpu, the setting the student is meant for
+    model.to(torch.device('cpu'))
+    predict(model, input_ids[:BATCH_SIZE], attention_masks[:BATCH_SIZE], torch.device('cpu'))
+    t0 = time.time()
+    predict(model, input_ids, attention_masks, torch.device('cpu'))
+    return len(input_ids) / (time.time() - t0)
+
+def fidelity(preds, target):
+    pearson_corr, _ = pearsonr(target, preds)
+    spearman_corr, _ = spearmanr(target, preds)
+    return pearson_corr, spearman_corr
+
+set_seed(SEED)
+device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+tokenizer = AutoTokenizer.from_pretrained(TEACHER_DIR)
+teacher = AutoModelForSequenceClassification.from_pretrained(TEACHER_DIR)
+student, layer_map = build_student(teacher, STUDENT_LAYERS)
+print(f"Student keeps teacher layers {layer_map}")
+
+df = pd.read_csv(TEACHER_PREDICTION_CSV)
+# a student trained on another student's scores would silently drift away from the teacher
+if 'scoring_backend' not in df.columns or (df['scoring_backend'] != 'teacher').any():
+    raise ValueError(f"{TEACHER_PREDICTION_CSV} was not scored by the teacher backend, re-run 06_prediction.py with BACKEND = \"teacher\"")
+df = df.dropna(subset=['content', 'predicted_bws_score'])
+df = df.drop_duplicates(subset=['content'])
+# the gold texts come from the same corpus, keep them out of training so the gold fidelity is out-of-sample for the student
+df_gold = pd.read_csv(GOLD_CSV)
+df = df[~df['content'].astype(str).str.strip().isin(set(df_gold['text'].astype(str).str.strip()))]
+df = df.sample(n=min(len(df), MAX_TRAIN_TEXTS + HOLDOUT_SIZE), random_state=SEED).reset_index(drop=True)
+
+df_holdout = df.iloc[:HOLDOUT_SIZE]
+df_train = df.iloc[HOLDOUT_SIZE:]
+
+train_ids, train_masks = encode_texts(tokenizer, df_train['content'])
+train_labels = torch.tensor(df_train['predicted_bws_score'].values, dtype=torch.float)
+train_dataset = TensorDataset(train_ids, train_masks, train_labels)
+train_dataloader = DataLoader(train_dataset, sampler=RandomSampler(train_dataset), batch_size=BATCH_SIZE)
+
+student.to(device)
+optimizer = AdamW(student.parameters(), lr=LEARNING_RATE, eps=1e-8)
+total_steps = len(train_dataloader) * EPOCHS
+scheduler = get_linear_schedule_with_warmup(optimizer, num_warmup_steps=int(total_steps * 0.06), num_training_steps=total_steps)
+loss_fn = nn.MSELoss()
+
+for epoch_i in range(0, EPOCHS):
+    student.train()
+    total_train_loss = 0
+    for step, batch in enumerate(train_dataloader):
+        b_input_ids = batch[0].to(device)
+        b_input_mask = batch[1].to(device)
+        b_labels = batch[2].to(device)
+
+        student.zero_grad()
+        result = student(b_input_ids, attention_mask=b_input_mask)
+        loss = loss_fn(result.logits.squeeze(-1), b_labels)
+        total_train_loss += loss.item()
+
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(student.parameters(), 1.0)
+        optimizer.step()
+        scheduler.step()
+
+    print(f"Epoch {epoch_i + 1}: train mse {total_train_loss / len(train_dataloader):.5f}")
+
+# fidelity to the teacher on held-out corpus texts, and to the bws gold scores.
+# the teacher was fitted on all of the gold texts in 05, so its gold numbers are in-sample and only an upper reference.
+holdout_ids, holdout_masks = encode_texts(tokenizer, df_holdout['content'])
+student_holdout = predict(student, holdout_ids, holdout_masks, device)
+teacher_pearson, teacher_spearman = fidelity(student_holdout, df_holdout['predicted_bws_score'].values)
+
+gold_ids, gold_masks = encode_texts(tokenizer, df_gold['text'])
+student_gold = predict(student, gold_ids, gold_masks, device)
+teacher.to(device)
+teacher_gold = predict(teacher, gold_ids, gold_masks, device)
+gold_pearson, gold_spearman = fidelity(student_gold, df_gold['bws_score'].values)
+teacher_gold_pearson, teacher_gold_spearman = fidelity(teacher_gold, df_gold['bws_score'].values)
+
+bench_ids, bench_masks = holdout_ids[:BENCHMARK_SIZE], holdout_masks[:BENCHMARK_SIZE]
+teacher_speed = cpu_throughput(teacher, bench_ids, bench_masks)
+student_speed = cpu_throughput(student, bench_ids, bench_masks)
+
+report = pd.DataFrame([
+    {
+        'model': 'teacher',
+        'layers': teacher.config.num_hidden_layers,
+        'cpu_texts_per_second': teacher_speed,
+        'speedup': 1.0,
+        'pearson_teacher': 1.0,
+        'spearman_teacher': 1.0,
+        'pearson_gold': teacher_gold_pearson,
+        'spearman_gold': teacher_gold_spearman,
+        'gold_fit': 'in-sample'
+    },
+    {
+        'model': 'student',
+        'layers': STUDENT_LAYERS,
+        'cpu_texts_per_second': student_speed,
+        'speedup': student_speed / teacher_speed,
+        'pearson_teacher': teacher_pearson,
+        'spearman_teacher': teacher_spearman,
+        'pearson_gold': gold_pearson,
+        'spearman_gold': gold_spearman,
+        'gold_fit': 'out-of-sample'
+    }
+])
+print(report.to_string(index=False))
+
+if not os.path.exists(STUDENT_DIR):
+    os.makedirs(STUDENT_DIR)
+
+student.save_pretrained(STUDENT_DIR)
+tokenizer.save_pretrained(STUDENT_DIR)
+report.to_csv(REPORT_CSV, index=False)
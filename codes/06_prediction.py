@@ -6,13 +6,27 @@ from tqdm import tqdm
 import os
 import numpy as np
 
-MODEL_DIR = "models/bws_regressor_final"
+# "teacher" is the fine-tuned roberta-base, "student" is the distilled model from 05b_distill_student_model.py
+BACKEND = "teacher"
+MODEL_DIRS = {
+    "teacher": "models/bws_regressor_final",
+    "student": "models/bws_regressor_student"
+}
+MODEL_DIR = MODEL_DIRS[BACKEND]
 INPUT_CSV = "data/scraper_result_data/combined/2024/X_2024_combined.csv"
 OUTPUT_CSV = "data/processed/final_bws_dataset.csv"
+# the teacher's scores are also kept in their own file, 05b_distill_student_model.py trains on it,
+# so scoring the corpus with the student does not overwrite the distillation labels
+TEACHER_OUTPUT_CSV = "data/processed/teacher_bws_predictions.csv"
 BATCH_SIZE = 32
 MAX_LEN = 128
+# also keep the mean-pooled last hidden state of every tweet, from the same forward pass.
+# the vectors go to a float16 memmap, row i belongs to the url in row i of EMBEDDING_INDEX_CSV.
+SAVE_EMBEDDINGS = False
+EMBEDDING_PATH = "data/processed/embeddings_f16.mmap"
+EMBEDDING_INDEX_CSV = "data/processed/embeddings_index.csv"
 
-device = torch.device('cuda')
+device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
     
 tokenizer = AutoTokenizer.from_pretrained(MODEL_DIR)
 model = AutoModelForSequenceClassification.from_pretrained(MODEL_DIR)
@@ -46,16 +60,34 @@ dataloader = DataLoader(dataset, sampler=SequentialSampler(dataset), batch_size=
 
 predictions = []
 
+if SAVE_EMBEDDINGS:
+    embeddings = np.memmap(EMBEDDING_PATH, dtype=np.float16, mode='w+', shape=(len(texts), model.config.hidden_size))
+    row = 0
+
 for batch in tqdm(dataloader, desc="Inference"):
     b_input_ids = batch[0].to(device)
     b_input_mask = batch[1].to(device)
     
     with torch.no_grad():
-        result = model(b_input_ids, token_type_ids=None, attention_mask=b_input_mask)
+        result = model(b_input_ids, token_type_ids=None, attention_mask=b_input_mask, output_hidden_states=SAVE_EMBEDDINGS)
     
     logits = result.logits
     predictions.extend(logits.cpu().numpy().flatten())
 
+    if SAVE_EMBEDDINGS:
+        # mean over the real tokens only, padding is masked out
+        mask = b_input_mask.unsqueeze(-1).to(result.hidden_states[-1].dtype)
+        pooled = (result.hidden_states[-1] * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        embeddings[row:row + len(pooled)] = pooled.cpu().numpy().astype(np.float16)
+        row += len(pooled)
+
 df['predicted_bws_score'] = predictions
+df['scoring_backend'] = BACKEND
+
+if SAVE_EMBEDDINGS:
+    embeddings.flush()
+    pd.DataFrame({"row": range(len(df)), "url": df["url"]}).to_csv(EMBEDDING_INDEX_CSV, index=False)
 
 df.to_csv(OUTPUT_CSV, index=False)
+if BACKEND == "teacher":
+    df[['url', 'content', 'predicted_bws_score', 'scoring_backend']].to_csv(TEACHER_OUTPUT_CSV, index=False)
@@ -0,0 +1,117 @@
+import pandas as pd
+import numpy as np
+import os
+
+"""
+similarity queries on the tweet embeddings written by 06_prediction.py (SAVE_EMBEDDINGS = True).
+the store is a float16 memmap, so it is read block by block and never loaded as a whole.
+search is exact: cosine similarity as a blocked matrix product, keeping a running top k per query.
+this is fast enough for one year of tweets, and it gives exact answers, so no approximate index is needed.
+mean-pooled roberta vectors all point in roughly the same direction, so the corpus mean is subtracted before
+normalizing, otherwise unrelated tweets would still have a cosine close to 1.
+the same pass can also list near-duplicate tweet pairs (retweeted statements, copy-pasted campaign messages).
+"""
+
+EMBEDDING_PATH = "data/processed/embeddings_f16.mmap"
+EMBEDDING_INDEX_CSV = "data/processed/embeddings_index.csv"
+NEIGHBOUR_CSV = "data/processed/embedding_neighbours.csv"
+DUPLICATE_CSV = "data/processed/embedding_near_duplicates.csv"
+QUERY_URLS = []
+NUM_RANDOM_QUERIES = 20
+TOP_K = 10
+BLOCK_SIZE = 65536
+# the self-join holds a DUPLICATE_BLOCK_SIZE x DUPLICATE_BLOCK_SIZE similarity matrix, 4096 is about 64 MB
+DUPLICATE_BLOCK_SIZE = 4096
+FIND_NEAR_DUPLICATES = False
+DUPLICATE_THRESHOLD = 0.98
+SEED = 114514
+
+def load_embeddings():
+    index = pd.read_csv(EMBEDDING_INDEX_CSV, dtype={"url": str})
+    dim = os.path.getsize(EMBEDDING_PATH) // (2 * len(index))
+    store = np.memmap(EMBEDDING_PATH, dtype=np.float16, mode='r', shape=(len(index), dim))
+    return store, index
+
+def corpus_mean(store):
+    total = np.zeros(store.shape[1], dtype=np.float64)
+    for start in range(0, len(store), BLOCK_SIZE):
+        total += np.asarray(store[start:start + BLOCK_SIZE], dtype=np.float64).sum(axis=0)
+    return (total / len(store)).astype(np.float32)
+
+def normalize(block, mean):
+    block = np.asarray(block, dtype=np.float32) - mean
+    return block / np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+
+def nearest_neighbours(store, queries, k, mean):
+    queries = normalize(queries, mean)
+    best_sim = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_idx = np.full((len(queries), k), -1, dtype=np.int64)
+
+    for start in range(0, len(store), BLOCK_SIZE):
+        block = normalize(store[start:start + BLOCK_SIZE], mean)
+        sim = queries @ block.T
+
+        # merge the top k of this block with the running top k
+        kk = min(k, sim.shape[1])
+        top = np.argpartition(-sim, kk - 1, axis=1)[:, :kk]
+        cand_sim = np.concatenate([best_sim, np.take_along_axis(sim, top, axis=1)], axis=1)
+        cand_idx = np.concatenate([best_idx, top + start], axis=1)
+        keep = np.argsort(-cand_sim, axis=1)[:, :k]
+        best_sim = np.take_along_axis(cand_sim, keep, axis=1)
+        best_idx = np.take_along_axis(cand_idx, keep, axis=1)
+
+    return best_idx, best_sim
+
+def near_duplicates(store, threshold, mean):
+    # blocked self-join over the upper triangle, pairs are (i, j) with i < j
+    pairs = []
+    for i_start in range(0, len(store), DUPLICATE_BLOCK_SIZE):
+        block_i = normalize(store[i_start:i_start + DUPLICATE_BLOCK_SIZE], mean)
+        for j_start in range(i_start, len(store), DUPLICATE_BLOCK_SIZE):
+            block_j = block_i if j_start == i_start else normalize(store[j_start:j_start + DUPLICATE_BLOCK_SIZE], mean)
+            sim = block_i @ block_j.T
+            rows, cols = np.nonzero(sim >= threshold)
+            rows = rows + i_start
+            cols = cols + j_start
+            keep = rows < cols
+            pairs.append(pd.DataFrame({
+                "row_a": rows[keep],
+                "row_b": cols[keep],
+                "similarity": sim[rows[keep] - i_start, cols[keep] - j_start]
+            }))
+    return pd.concat(pairs, ignore_index=True)
+
+store, index = load_embeddings()
+mean = corpus_mean(store)
+
+if QUERY_URLS:
+    query_rows = index.loc[index["url"].isin(QUERY_URLS), "row"].to_numpy()
+else:
+    rng = np.random.default_rng(SEED)
+    query_rows = rng.choice(len(index), size=min(NUM_RANDOM_QUERIES, len(index)), replace=False)
+
+# the query itself comes back as its own first neighbour, so ask for one more
+neighbour_idx, neighbour_sim = nearest_neighbours(store, store[query_rows], TOP_K + 1, mean)
+
+output_data = []
+for q, query_row in enumerate(query_rows):
+    rank = 0
+    for idx, sim in zip(neighbour_idx[q], neighbour_sim[q]):
+        # -1 marks an empty slot when the store has fewer than TOP_K + 1 rows
+        if idx < 0 or idx == query_row or rank == TOP_K:
+            continue
+        rank += 1
+        output_data.append({
+            "query_url": index.at[query_row, "url"],
+            "rank": rank,
+            "neighbour_url": index.at[idx, "url"],
+            "similarity": sim
+        })
+
+pd.DataFrame(output_data).to_csv(NEIGHBOUR_CSV, index=False)
+
+if FIND_NEAR_DUPLICATES:
+    duplicates = near_duplicates(store, DUPLICATE_THRESHOLD, mean)
+    duplicates["url_a"] = index["url"].to_numpy()[duplicates["row_a"]]
+    duplicates["url_b"] = index["url"].to_numpy()[duplicates["row_b"]]
+    duplicates.to_csv(DUPLICATE_CSV, index=False)
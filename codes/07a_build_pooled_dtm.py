@@ -0,0 +1,229 @@
+import pandas as pd
+import numpy as np
+import scipy.sparse as sp
+import scipy.io
+import re
+import os
+import unicodedata
+from collections import Counter
+from multiprocessing import Pool
+
+"""
+builds the weekly pooled document-term matrix of 09_stm_pool.R in python, so the stm fit can start from it.
+the r script pastes all tweets of an official in a calendar week into one string and then tokenizes with quanteda,
+which is slow and needs a lot of memory on the full dataset.
+here the_dataset.csv is read in chunks, the tweets are tokenized in parallel, and the counts of each tweet are
+added straight into its (official_id, calendar_week) row, so no pooled string is ever built.
+filters, recoding, stopwords and the min_docfreq trim follow 09_stm_pool.R.
+the stopwords are the snowball english and spanish lists of quanteda's stopwords("en") and stopwords("es"),
+copied here so nothing has to be downloaded.
+the tokenizer follows quanteda's tokens() with the options of 09: abbreviations keep their inner dots ("u.s.",
+"h.r." become u.s and h.r), hyphenated words, hashtags and mentions stay one token, emoji and other symbols are
+kept as their own tokens (remove_symbols = FALSE), punctuation, numbers and urls are removed.
+the one known difference: quanteda splits scripts written without spaces (chinese, thai) with a dictionary,
+here such a run of characters stays one token, which does not matter for english and spanish tweets.
+
+output: a matrix market file (documents x terms), the vocabulary (one term per line) and the docvars as parquet.
+"""
+
+INPUT_CSV = "data/cleaned/the_dataset.csv"
+OFFICER_CSV = "data/raw/official_data.csv"
+DTM_PATH = "data/cleaned/pooled_dtm.mtx"
+VOCAB_PATH = "data/cleaned/pooled_vocab.txt"
+DOCVARS_PATH = "data/cleaned/pooled_docvars.parquet"
+CHUNK_SIZE = 50000
+NUM_WORKERS = max(os.cpu_count() - 1, 1)
+MIN_DOCFREQ = 3
+
+SNOWBALL_ENGLISH = [
+    "i", "me", "my", "myself", "we", "our", "ours", "ourselves", "you", "your", "yours", "yourself",
+    "yourselves", "he", "him", "his", "himself", "she", "her", "hers", "herself", "it", "its", "itself",
+    "they", "them", "their", "theirs", "themselves", "what", "which", "who", "whom", "this", "that", "these",
+    "those", "am", "is", "are", "was", "were", "be", "been", "being", "have", "has", "had", "having", "do",
+    "does", "did", "doing", "would", "should", "could", "ought", "i'm", "you're", "he's", "she's", "it's",
+    "we're", "they're", "i've", "you've", "we've", "they've", "i'd", "you'd", "he'd", "she'd", "we'd",
+    "they'd", "i'll", "you'll", "he'll", "she'll", "we'll", "they'll", "isn't", "aren't", "wasn't", "weren't",
+    "hasn't", "haven't", "hadn't", "doesn't", "don't", "didn't", "won't", "wouldn't", "shan't", "shouldn't",
+    "can't", "cannot", "couldn't", "mustn't", "let's", "that's", "who's", "what's", "here's", "there's",
+    "when's", "where's", "why's", "how's", "a", "an", "the", "and", "but", "if", "or", "because", "as",
+    "until", "while", "of", "at", "by", "for", "with", "about", "against", "between", "into", "through",
+    "during", "before", "after", "above", "below", "to", "from", "up", "down", "in", "out", "on", "off",
+    "over", "under", "again", "further", "then", "once", "here", "there", "when", "where", "why", "how",
+    "all", "any", "both", "each", "few", "more", "most", "other", "some", "such", "no", "nor", "not", "only",
+    "own", "same", "so", "than", "too", "very", "will"
+]
+
+SNOWBALL_SPANISH = [
+    "de", "la", "que", "el", "en", "y", "a", "los", "del", "se", "las", "por", "un", "para", "con", "no",
+    "una", "su", "al", "lo", "como", "más", "pero", "sus", "le", "ya", "o", "este", "sí", "porque", "esta",
+    "entre", "cuando", "muy", "sin", "sobre", "también", "me", "hasta", "hay", "donde", "quien", "desde",
+    "todo", "nos", "durante", "todos", "uno", "les", "ni", "contra", "otros", "ese", "eso", "ante", "ellos",
+    "e", "esto", "mí", "antes", "algunos", "qué", "unos", "yo", "otro", "otras", "otra", "él", "tanto", "esa",
+    "estos", "mucho", "quienes", "nada", "muchos", "cual", "poco", "ella", "estar", "estas", "algunas",
+    "algo", "nosotros", "mi", "mis", "tú", "te", "ti", "tu", "tus", "ellas", "nosotras", "vosotros",
+    "vosotras", "os", "mío", "mía", "míos", "mías", "tuyo", "tuya", "tuyos", "tuyas", "suyo", "suya", "suyos",
+    "suyas", "nuestro", "nuestra", "nuestros", "nuestras", "vuestro", "vuestra", "vuestros", "vuestras",
+    "esos", "esas", "estoy", "estás", "está", "estamos", "estáis", "están", "esté", "estés", "estemos",
+    "estéis", "estén", "estaré", "estarás", "estará", "estaremos", "estaréis", "estarán", "estaría",
+    "estarías", "estaríamos", "estaríais", "estarían", "estaba", "estabas", "estábamos", "estabais",
+    "estaban", "estuve", "estuviste", "estuvo", "estuvimos", "estuvisteis", "estuvieron", "estuviera",
+    "estuvieras", "estuviéramos", "estuvierais", "estuvieran", "estuviese", "estuvieses", "estuviésemos",
+    "estuvieseis", "estuviesen", "estando", "estado", "estada", "estados", "estadas", "estad", "he", "has",
+    "ha", "hemos", "habéis", "han", "haya", "hayas", "hayamos", "hayáis", "hayan", "habré", "habrás", "habrá",
+    "habremos", "habréis", "habrán", "habría", "habrías", "habríamos", "habríais", "habrían", "había",
+    "habías", "habíamos", "habíais", "habían", "hube", "hubiste", "hubo", "hubimos", "hubisteis", "hubieron",
+    "hubiera", "hubieras", "hubiéramos", "hubierais", "hubieran", "hubiese", "hubieses", "hubiésemos",
+    "hubieseis", "hubiesen", "habiendo", "habido", "habida", "habidos", "habidas", "soy", "eres", "es",
+    "somos", "sois", "son", "sea", "seas", "seamos", "seáis", "sean", "seré", "serás", "será", "seremos",
+    "seréis", "serán", "sería", "serías", "seríamos", "seríais", "serían", "era", "eras", "éramos", "erais",
+    "eran", "fui", "fuiste", "fue", "fuimos", "fuisteis", "fueron", "fuera", "fueras", "fuéramos", "fuerais",
+    "fueran", "fuese", "fueses", "fuésemos", "fueseis", "fuesen", "siendo", "sido", "tengo", "tienes",
+    "tiene", "tenemos", "tenéis", "tienen", "tenga", "tengas", "tengamos", "tengáis", "tengan", "tendré",
+    "tendrás", "tendrá", "tendremos", "tendréis", "tendrán", "tendría", "tendrías", "tendríamos", "tendríais",
+    "tendrían", "tenía", "tenías", "teníamos", "teníais", "tenían", "tuve", "tuviste", "tuvo", "tuvimos",
+    "tuvisteis", "tuvieron", "tuviera", "tuvieras", "tuviéramos", "tuvierais", "tuvieran", "tuviese",
+    "tuvieses", "tuviésemos", "tuvieseis", "tuviesen", "teniendo", "tenido", "tenida", "tenidos", "tenidas",
+    "tened"
+]
+
+EXTRA_STOPWORDS = [
+    "it’s", "i’m", "don’t", "can’t", "won’t",
+    "just", "like",
+    "go", "went", "going", "gone",
+    "make", "made",
+    "get", "got"
+]
+
+URL_PATTERN = re.compile(r'https?://\S+|www\.\S+')
+# a word, with inner dots, apostrophes and hyphens, or a single symbol such as an emoji. a flag is a pair of
+# regional indicators, and an emoji can carry a skin tone or join other emoji with a zero width joiner.
+TOKEN_PATTERN = re.compile(
+    r"[#@]?\w+(?:[.'’-]\w+)*"
+    r"|[\U0001F1E6-\U0001F1FF]{2}"
+    r"|[^\w\s](?:[\u200d\ufe0f\U0001F3FB-\U0001F3FF]+[^\w\s]?)*"
+)
+NUMBER_PATTERN = re.compile(r'[\d.,]+')
+
+def get_stopwords():
+    return set(SNOWBALL_ENGLISH) | set(SNOWBALL_SPANISH) | set(EXTRA_STOPWORDS)
+
+def init_worker(stopword_list):
+    global STOPWORDS
+    STOPWORDS = stopword_list
+
+def is_kept(token):
+    if not (token[0].isalnum() or token[0] in '#@_'):
+        # what is not a word is kept only if it is a symbol, punctuation is removed
+        return unicodedata.category(token[0]).startswith('S')
+    return token not in STOPWORDS and not NUMBER_PATTERN.fullmatch(token.lstrip('#@'))
+
+def tokenize(text):
+    text = URL_PATTERN.sub(' ', text.lower())
+    return [token for token in TOKEN_PATTERN.findall(text) if is_kept(token)]
+
+def count_chunk(chunk):
+    # one counter per pooled document in this chunk
+    doc_counts = {}
+    for key, text in chunk:
+        if key not in doc_counts:
+            doc_counts[key] = Counter()
+        doc_counts[key].update(tokenize(text))
+    return doc_counts
+
+def prepare_chunk(df, officer_data):
+    df = df.merge(officer_data, on="official_id", how="left")
+    datetime = pd.to_datetime(df["datetime"], utc=True)
+    df = df[(~datetime.dt.month.isin([1, 2, 3, 4])) & (datetime.dt.year == 2024)].copy()
+    df["datetime"] = datetime[df.index]
+
+    df["race"] = df["race"].where(df["race"].isin(["White", "Black", "Latino", "Asian American"]), "Other")
+    df["party"] = df["party"].where(df["party"].isin(["Democratic", "Republican"]), "Other")
+    df["content"] = df["content"].fillna("").astype(str)
+    # tweets without an official or a week cannot be pooled
+    df = df.dropna(subset=["official_id", "calendar_week"])
+    return df
+
+def read_chunks(officer_data):
+    for df in pd.read_csv(INPUT_CSV, chunksize=CHUNK_SIZE, dtype={"url": str, "official_id": str}):
+        yield prepare_chunk(df, officer_data)
+
+def main():
+    officer_data = pd.read_csv(OFFICER_CSV, dtype={"official_id": str})[["official_id", "race", "party"]]
+    officer_data = officer_data.drop_duplicates(subset=["official_id"])
+
+    doc_ids = {}
+    vocab_ids = {}
+    rows, cols, counts = [], [], []
+    partial_docvars = []
+
+    def add_counts(doc_counts):
+        for key, counter in doc_counts.items():
+            doc = doc_ids.setdefault(key, len(doc_ids))
+            rows.append(np.full(len(counter), doc, dtype=np.int64))
+            cols.append(np.fromiter((vocab_ids.setdefault(t, len(vocab_ids)) for t in counter), dtype=np.int64, count=len(counter)))
+            counts.append(np.fromiter(counter.values(), dtype=np.int64, count=len(counter)))
+
+    # only NUM_WORKERS chunks are held in memory at a time
+    with Pool(NUM_WORKERS, initializer=init_worker, initargs=(get_stopwords(),)) as pool:
+        batch = []
+        for df in read_chunks(officer_data):
+            partial_docvars.append(
+                df.assign(score_count=df["predicted_bws_score"].notna())
+                .groupby(["official_id", "calendar_week"], sort=False)
+                .agg(
+                    score_sum=("predicted_bws_score", "sum"),
+                    score_count=("score_count", "sum"),
+                    datetime=("datetime", "min"),
+                    race=("race", "first"),
+                    party=("party", "first"),
+                    tweet_count=("content", "size")
+                )
+            )
+            batch.append(list(zip(zip(df["official_id"], df["calendar_week"]), df["content"])))
+            if len(batch) == NUM_WORKERS:
+                for doc_counts in pool.map(count_chunk, batch):
+                    add_counts(doc_counts)
+                batch = []
+        for doc_counts in pool.map(count_chunk, batch):
+            add_counts(doc_counts)
+
+    # a pooled document can span chunks, so duplicate (doc, term) entries are summed here
+    dtm = sp.csr_matrix(
+        (np.concatenate(counts), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(len(doc_ids), len(vocab_ids))
+    )
+    vocab = np.array(list(vocab_ids))
+
+    # dfm_trim(min_docfreq = 3), terms sorted alphabetically like quanteda's vocabulary
+    docfreq = np.bincount(dtm.indices, minlength=dtm.shape[1])
+    keep = np.flatnonzero(docfreq >= MIN_DOCFREQ)
+    keep = keep[np.argsort(vocab[keep])]
+    dtm = dtm[:, keep]
+    vocab = vocab[keep]
+
+    docvars = pd.concat(partial_docvars).groupby(level=[0, 1], sort=False).agg(
+        score_sum=("score_sum", "sum"),
+        score_count=("score_count", "sum"),
+        datetime=("datetime", "min"),
+        race=("race", "first"),
+        party=("party", "first"),
+        tweet_count=("tweet_count", "sum")
+    )
+    docvars["predicted_bws_score"] = docvars["score_sum"] / docvars["score_count"].replace(0, np.nan)
+    docvars["date_numeric"] = (docvars["datetime"].dt.tz_localize(None).dt.normalize() - pd.Timestamp("1970-01-01")).dt.days
+    docvars = docvars.drop(columns=["score_sum", "score_count"]).reset_index()
+
+    # same document order as the group_by/summarise in 09_stm_pool.R
+    docvars["doc"] = [doc_ids[key] for key in zip(docvars["official_id"], docvars["calendar_week"])]
+    docvars = docvars.sort_values(["official_id", "calendar_week"]).reset_index(drop=True)
+    dtm = dtm[docvars.pop("doc").to_numpy()]
+
+    scipy.io.mmwrite(DTM_PATH, dtm, field="integer")
+    with open(VOCAB_PATH, "w", encoding="utf-8") as f:
+        f.write("\n".join(vocab) + "\n")
+    docvars.to_parquet(DOCVARS_PATH, index=False)
+
+    print(f"{dtm.shape[0]} documents, {dtm.shape[1]} terms, {dtm.nnz} non-zero counts")
+
+if __name__ == "__main__":
+    main()
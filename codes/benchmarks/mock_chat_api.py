@@ -0,0 +1,128 @@
+import json
+import random
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+"""
+a local stand-in for the chat-completions endpoint used by 02_openai_label_asynchronism.py.
+it answers every request with a random "most,least" pair after a configurable latency,
+and fails a configurable share of requests with 429 (rate limit) or 500 (server error).
+the counters are kept so the benchmark can report how many requests, retries and failures a run produced,
+and the service time of every request (from reading the request to sending the reply) for its percentiles.
+"""
+
+class MockChatAPI:
+    def __init__(self, latency_ms=200, jitter_ms=50, error_rate=0.01, rate_limit_rate=0.02, seed=114514):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "errors": 0}
+        self.service_times = []
+        self.failed_service_times = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_stats(self):
+        with self.lock:
+            for key in self.stats:
+                self.stats[key] = 0
+            self.service_times = []
+            self.failed_service_times = []
+
+    def record(self, seconds, failed):
+        with self.lock:
+            self.service_times.append(seconds)
+            if failed:
+                self.failed_service_times.append(seconds)
+
+    def latency_summary(self):
+        # every 429 or 500 makes the client send the request again, so failed requests are the retries
+        with self.lock:
+            times = sorted(self.service_times)
+            summary = {
+                "retries": len(self.failed_service_times),
+                "retry_service_seconds": sum(self.failed_service_times)
+            }
+        if len(times) >= 2:
+            percentiles = statistics.quantiles(times, n=100, method="inclusive")
+            summary["service_ms_p50"] = percentiles[49] * 1000
+            summary["service_ms_p95"] = percentiles[94] * 1000
+        return summary
+
+    def draw(self):
+        with self.lock:
+            self.stats["requests"] += 1
+            latency = max(self.random.gauss(self.latency_ms, self.jitter_ms), 0) / 1000
+            roll = self.random.random()
+            most, least = self.random.sample(range(1, 5), 2)
+            if roll < self.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                return latency, 429
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.stats["errors"] += 1
+                return latency, 500
+            self.stats["ok"] += 1
+            return latency, f"{most},{least}"
+
+    def handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                t0 = time.perf_counter()
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                latency, result = api.draw()
+                time.sleep(latency)
+
+                if result == 429:
+                    self.reply(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                               {"retry-after-ms": "100"})
+                elif result == 500:
+                    self.reply(500, {"error": {"message": "Internal server error", "type": "server_error"}})
+                else:
+                    self.reply(200, {
+                        "id": "chatcmpl-mock",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": "mock",
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": result},
+                            "finish_reason": "stop"
+                        }],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+                    })
+                api.record(time.perf_counter() - t0, result in (429, 500))
+
+            def reply(self, status, body, headers=None):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
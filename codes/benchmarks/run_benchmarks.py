@@ -0,0 +1,282 @@
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from mock_chat_api import MockChatAPI
+import synthetic_data
+
+"""
+throughput benchmark for the pipeline scripts, on synthetic data and without network access.
+every stage runs the real script in a fresh process, inside a temporary folder laid out like the project root,
+with its input generated at each scale in SCALES. the labelling stage talks to a local mock of the
+chat-completions endpoint, its report also has the p50/p95 service time of the mock and the retries.
+the tokenization stage runs 06_prediction.py up to the end of its tokenize loop, on the full scale, so the memory
+of the token tensors is measured without the cost of inference.
+the prediction stages use the trained model folder when it exists, otherwise a small
+randomly initialized roberta with a byte-level bpe tokenizer trained on the synthetic tweets, so it runs without
+downloads or real artifacts. the small model measures the pipeline around the model, set SYNTHETIC_LAYERS = 12
+and SYNTHETIC_HIDDEN = 768 to get the cost of roberta-base (about 0.2 s per tweet on one cpu core).
+for every stage and scale the report stores rows per second, time per row and peak rss, as json in RESULTS_DIR,
+named by commit, so two runs on different commits can be compared with COMPARE_WITH.
+
+run from the project root: python codes/benchmarks/run_benchmarks.py
+"""
+
+SCALES = [10000, 100000]
+STAGES = [
+    "parse_broken_csv", "generate_balanced_design", "bws_labelling", "bws_scoring", "pooled_dtm",
+    "tokenization", "prediction"
+]
+RESULTS_DIR = "benchmarks/results"
+COMPARE_WITH = None
+WORK_ROOT = tempfile.gettempdir()
+STAGE_TIMEOUT = 3600
+SEED = 114514
+
+# stages that do not scale linearly get a smaller share of each scale
+DESIGN_MAX_TEXTS = 3000
+API_MAX_TUPLES = 2000
+# inference is slow on cpu, so it runs on this share of each scale, which still grows with the scale
+INFERENCE_SHARE = 0.2
+MODEL_DIR = "models/bws_regressor_final"
+# shape of the synthetic model used when MODEL_DIR does not exist
+SYNTHETIC_LAYERS = 2
+SYNTHETIC_HIDDEN = 256
+SYNTHETIC_VOCAB_SIZE = 8000
+
+MOCK_LATENCY_MS = 200
+MOCK_JITTER_MS = 50
+MOCK_ERROR_RATE = 0.01
+MOCK_RATE_LIMIT_RATE = 0.02
+
+CODES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUN_STAGE = os.path.join(CODES_DIR, "benchmarks", "run_stage.py")
+
+def prepare_parse_broken_csv(workspace, scale, rng, api):
+    synthetic_data.write_broken_scraper_csv(
+        os.path.join(workspace, "data/scraper_result_data/raw/2024/X_2024_part_0.csv"), scale, rng
+    )
+    os.makedirs(os.path.join(workspace, "data/scraper_result_data/combined/2024"))
+    return "00_2024_scraped_data_combiner.py", {}, scale
+
+def prepare_generate_balanced_design(workspace, scale, rng, api):
+    num_texts = max(min(scale // 100, DESIGN_MAX_TEXTS), 4)
+    synthetic_data.write_combined_csv(
+        os.path.join(workspace, "data/scraper_result_data/combined/2024/X_2024_combined.csv"), num_texts * 2, rng
+    )
+    os.makedirs(os.path.join(workspace, "data/processed"))
+    return "01_bws_text_data_generator.py", {"NUM_TEXT": num_texts}, num_texts
+
+def prepare_bws_labelling(workspace, scale, rng, api):
+    num_tuples = max(min(scale // 10, API_MAX_TUPLES), 1)
+    input_path = os.path.join(workspace, "data/processed/bws_text_data.csv")
+    synthetic_data.write_bws_tuples(input_path, num_tuples, rng, labelled=False)
+    # the script resumes from its own output file, so it has to exist before the first run
+    shutil.copy(input_path, os.path.join(workspace, "data/processed/bws_text_data_openai_labelled.csv"))
+    return "02_openai_label_asynchronism.py", {"BASE_URL": api.base_url}, num_tuples
+
+def prepare_bws_scoring(workspace, scale, rng, api):
+    synthetic_data.write_bws_tuples(
+        os.path.join(workspace, "data/processed/bws_text_data_openai_labelled.csv"), scale, rng
+    )
+    return "03_calculate_bws_scores.py", {}, scale
+
+def prepare_pooled_dtm(workspace, scale, rng, api):
+    synthetic_data.write_the_dataset(
+        os.path.join(workspace, "data/cleaned/the_dataset.csv"),
+        os.path.join(workspace, "data/raw/official_data.csv"),
+        scale, rng
+    )
+    return "07a_build_pooled_dtm.py", {}, scale
+
+def build_synthetic_model(model_dir, rng):
+    # imported here, so the other stages do not need torch
+    import torch
+    from tokenizers import ByteLevelBPETokenizer
+    from transformers import RobertaConfig, RobertaForSequenceClassification, RobertaTokenizerFast
+
+    os.makedirs(model_dir)
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator(
+        synthetic_data.tweet_texts(5000, rng), vocab_size=SYNTHETIC_VOCAB_SIZE,
+        special_tokens=["<s>", "<pad>", "</s>", "<unk>", "<mask>"]
+    )
+    bpe.save_model(model_dir)
+    tokenizer = RobertaTokenizerFast(
+        vocab_file=os.path.join(model_dir, "vocab.json"), merges_file=os.path.join(model_dir, "merges.txt")
+    )
+    tokenizer.save_pretrained(model_dir)
+
+    torch.manual_seed(SEED)
+    config = RobertaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=SYNTHETIC_HIDDEN,
+        num_hidden_layers=SYNTHETIC_LAYERS,
+        num_attention_heads=SYNTHETIC_HIDDEN // 64,
+        intermediate_size=SYNTHETIC_HIDDEN * 4,
+        max_position_embeddings=514,
+        pad_token_id=tokenizer.pad_token_id,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        num_labels=1
+    )
+    RobertaForSequenceClassification(config).save_pretrained(model_dir)
+
+def prepare_prediction_input(workspace, num_rows, rng):
+    synthetic_data.write_combined_csv(
+        os.path.join(workspace, "data/scraper_result_data/combined/2024/X_2024_combined.csv"), num_rows, rng
+    )
+    os.makedirs(os.path.join(workspace, "data/processed"))
+    if os.path.isdir(MODEL_DIR):
+        return os.path.abspath(MODEL_DIR)
+    model_dir = os.path.join(workspace, "models/bws_regressor_synthetic")
+    build_synthetic_model(model_dir, rng)
+    return model_dir
+
+def prepare_tokenization(workspace, scale, rng, api):
+    model_dir = prepare_prediction_input(workspace, scale, rng)
+    return "06_prediction.py", {"MODEL_DIR": model_dir}, scale
+
+def prepare_prediction(workspace, scale, rng, api):
+    num_rows = max(int(scale * INFERENCE_SHARE), 1)
+    model_dir = prepare_prediction_input(workspace, num_rows, rng)
+    return "06_prediction.py", {"MODEL_DIR": model_dir}, num_rows
+
+PREPARE = {
+    "parse_broken_csv": prepare_parse_broken_csv,
+    "generate_balanced_design": prepare_generate_balanced_design,
+    "bws_labelling": prepare_bws_labelling,
+    "bws_scoring": prepare_bws_scoring,
+    "pooled_dtm": prepare_pooled_dtm,
+    "tokenization": prepare_tokenization,
+    "prediction": prepare_prediction
+}
+
+# stages that run a script only up to the last assignment to this name, see run_stage.py
+STOP_AFTER = {
+    "tokenization": "attention_masks"
+}
+
+def run_stage(stage, scale, api):
+    rng = np.random.default_rng([SEED, scale])
+    workspace = tempfile.mkdtemp(prefix=f"bench_{stage}_", dir=WORK_ROOT)
+    result = {"stage": stage, "scale": scale}
+    try:
+        prepared = PREPARE[stage](workspace, scale, rng, api)
+        if prepared is None:
+            result["status"] = "skipped"
+            return result
+        script, overrides, rows = prepared
+        result["rows"] = rows
+
+        api.reset_stats()
+        result_path = os.path.join(workspace, "stage_result.json")
+        log_path = os.path.join(workspace, "stage.log")
+        env = dict(os.environ, OPENAI_API_KEY="benchmark")
+        command = [sys.executable, RUN_STAGE, os.path.join(CODES_DIR, script), json.dumps(overrides), result_path]
+        if stage in STOP_AFTER:
+            command.append(STOP_AFTER[stage])
+        with open(log_path, "w") as log:
+            process = subprocess.run(
+                command, cwd=workspace, env=env, stdout=log, stderr=subprocess.STDOUT, timeout=STAGE_TIMEOUT
+            )
+
+        if process.returncode != 0 or not os.path.exists(result_path):
+            with open(log_path) as log:
+                result["status"] = "failed"
+                result["error"] = log.read()[-2000:]
+            return result
+
+        with open(result_path) as f:
+            result.update(json.load(f))
+        result["status"] = "ok"
+        result["rows_per_second"] = rows / result["seconds"] if result["seconds"] > 0 else None
+        result["ms_per_row"] = result["seconds"] * 1000 / rows
+        if stage == "bws_labelling":
+            result["api"] = dict(api.stats)
+            result["api_latency"] = api.latency_summary()
+        return result
+    except subprocess.TimeoutExpired:
+        result["status"] = "timeout"
+        return result
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", CODES_DIR], capture_output=True, text=True).stdout.strip() != ""
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def compare(report, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    before = {(r["stage"], r["scale"]): r for r in previous["stages"] if r.get("status") == "ok"}
+    print(f"\nCompared with {previous_path} (commit {previous.get('commit')})")
+    print(f"{'stage':<26}{'scale':>10}{'rows/s before':>16}{'rows/s now':>14}{'speedup':>10}{'rss MB before':>16}{'rss MB now':>12}")
+    for r in report["stages"]:
+        old = before.get((r["stage"], r["scale"]))
+        if old is None or r.get("status") != "ok":
+            continue
+        speedup = r["rows_per_second"] / old["rows_per_second"]
+        print(f"{r['stage']:<26}{r['scale']:>10}{old['rows_per_second']:>16.1f}{r['rows_per_second']:>14.1f}"
+              f"{speedup:>9.2f}x{old['peak_rss_mb']:>16.1f}{r['peak_rss_mb']:>12.1f}")
+
+def main():
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "scales": SCALES,
+        "mock_api": {
+            "latency_ms": MOCK_LATENCY_MS,
+            "jitter_ms": MOCK_JITTER_MS,
+            "error_rate": MOCK_ERROR_RATE,
+            "rate_limit_rate": MOCK_RATE_LIMIT_RATE
+        },
+        "prediction_model": os.path.abspath(MODEL_DIR) if os.path.isdir(MODEL_DIR) else {
+            "synthetic_layers": SYNTHETIC_LAYERS,
+            "synthetic_hidden": SYNTHETIC_HIDDEN
+        },
+        "stages": []
+    }
+
+    api = MockChatAPI(MOCK_LATENCY_MS, MOCK_JITTER_MS, MOCK_ERROR_RATE, MOCK_RATE_LIMIT_RATE, SEED).start()
+    try:
+        for scale in SCALES:
+            for stage in STAGES:
+                result = run_stage(stage, scale, api)
+                report["stages"].append(result)
+                if result["status"] == "ok":
+                    print(f"{stage:<26}{scale:>10} rows  {result['rows_per_second']:>12.1f} rows/s"
+                          f"  {result['ms_per_row']:>9.3f} ms/row  {result['peak_rss_mb']:>8.1f} MB")
+                else:
+                    print(f"{stage:<26}{scale:>10} rows  {result['status']}")
+    finally:
+        api.stop()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_path = os.path.join(RESULTS_DIR, f"{timestamp}_{(commit or 'nocommit')[:8]}.json")
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output_path}")
+
+    if COMPARE_WITH:
+        compare(report, COMPARE_WITH)
+
+if __name__ == "__main__":
+    main()
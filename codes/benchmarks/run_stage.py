@@ -0,0 +1,130 @@
+import ast
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import types
+
+"""
+runs one pipeline script the way it is normally run (as __main__, from the data root), with some of its
+upper-case module constants replaced, e.g. NUM_TEXT or BASE_URL. the scripts do their work at module level,
+so this is how the benchmark can point them at synthetic data without changing them.
+imports are executed and timed first, so the stage time does not include loading pandas or torch.
+with a stop name, the script runs only up to and including the last top-level assignment to that name,
+e.g. attention_masks runs the tokenization of 06_prediction.py without the inference after it.
+
+usage: python run_stage.py <script> <overrides as json> <result json path> [stop name]
+"""
+
+def process_tree_rss_mb(root_pid):
+    # rss of root_pid plus all its descendants, from /proc
+    parents = {}
+    rss = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # the process name can contain spaces, the ppid is the second field after it
+                parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        rss[int(entry)] = int(line.split()[1])
+                        break
+        except (OSError, IndexError, ValueError):
+            continue
+
+    tree = {root_pid}
+    grown = True
+    while grown:
+        children = {pid for pid, ppid in parents.items() if ppid in tree} - tree
+        tree |= children
+        grown = bool(children)
+    return sum(rss.get(pid, 0) for pid in tree) / 1024
+
+class PeakRSSSampler:
+    # stages like 07a do their work in multiprocessing workers, so the memory of the whole process tree is
+    # sampled in the background. ru_maxrss is kept across fork and exec on linux, so it cannot be used here.
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0.0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, process_tree_rss_mb(os.getpid()))
+            self.stopped.wait(self.interval)
+
+    def start(self):
+        if os.path.isdir("/proc"):
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+            # VmHWM catches a peak of the main process that fell between two samples
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return max(self.peak, int(line.split()[1]) / 1024)
+            return self.peak
+        # no /proc (macos): ru_maxrss is in bytes there
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        return usage / 1024 ** 2
+
+def assigned_names(node):
+    if isinstance(node, ast.Assign):
+        return {target.id for target in node.targets if isinstance(target, ast.Name)}
+    return set()
+
+script_path, overrides, result_path = sys.argv[1], json.loads(sys.argv[2]), sys.argv[3]
+stop_after = sys.argv[4] if len(sys.argv) > 4 else None
+
+with open(script_path, encoding="utf-8") as f:
+    tree = ast.parse(f.read(), filename=script_path)
+
+for node in tree.body:
+    if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+        name = node.targets[0].id
+        if name in overrides:
+            node.value = ast.parse(repr(overrides.pop(name)), mode="eval").body
+
+if overrides:
+    sys.exit(f"{script_path} has no module constant(s) {sorted(overrides)}")
+
+if stop_after is not None:
+    stops = [i for i, node in enumerate(tree.body) if stop_after in assigned_names(node)]
+    if not stops:
+        sys.exit(f"{script_path} never assigns {stop_after}")
+    tree.body = tree.body[:stops[-1] + 1]
+
+imports = ast.Module(body=[n for n in tree.body if isinstance(n, (ast.Import, ast.ImportFrom))], type_ignores=[])
+rest = ast.Module(body=[n for n in tree.body if not isinstance(n, (ast.Import, ast.ImportFrom))], type_ignores=[])
+# a real __main__ module, so multiprocessing can pickle the functions the script defines
+module = types.ModuleType("__main__")
+module.__file__ = script_path
+sys.modules["__main__"] = module
+namespace = module.__dict__
+
+t0 = time.perf_counter()
+exec(compile(imports, script_path, "exec"), namespace)
+import_seconds = time.perf_counter() - t0
+
+sampler = PeakRSSSampler().start()
+t0 = time.perf_counter()
+exec(compile(rest, script_path, "exec"), namespace)
+seconds = time.perf_counter() - t0
+peak_rss = sampler.stop()
+
+with open(result_path, "w") as f:
+    json.dump({
+        "import_seconds": import_seconds,
+        "seconds": seconds,
+        "peak_rss_mb": peak_rss
+    }, f)
@@ -0,0 +1,104 @@
+import pandas as pd
+import numpy as np
+import os
+
+"""
+synthetic inputs for the benchmark suite, in the same layout as the real data/ folder.
+everything is written in chunks, so 10M rows never sit in memory at once.
+the texts are random political-sounding words with hashtags, mentions, urls, emoji, commas and line breaks,
+so the broken-csv parser, the tokenizers and the model all see tweet-like input.
+"""
+
+CHUNK_ROWS = 100000
+NUM_OFFICIALS = 500
+
+WORDS = np.array([
+    "vote", "today", "america", "families", "border", "economy", "jobs", "taxes", "health", "care",
+    "hurricane", "update", "shelter", "safe", "stay", "community", "proud", "honor", "veterans", "school",
+    "students", "teachers", "inflation", "prices", "energy", "climate", "rights", "freedom", "democracy", "election",
+    "president", "congress", "senate", "bill", "law", "funding", "support", "fight", "never", "always",
+    "great", "terrible", "disaster", "crisis", "record", "historic", "thank", "you", "everyone", "together",
+    "the", "and", "to", "of", "we", "our", "is", "for", "this", "in",
+    "el", "de", "la", "que", "y", "en", "los", "por", "it’s", "don’t",
+    "#vote", "#election2024", "#hurricane", "@potus", "@housegop", "@senatedems", "2024", "100",
+    "🇺🇸", "🔥", "https://t.co/abc123", "now,", "again,", "today,", "!!!", "..."
+])
+
+def tweet_texts(n, rng, line_breaks=False):
+    lengths = rng.integers(5, 40, n)
+    words = WORDS[rng.integers(0, len(WORDS), lengths.sum())]
+    texts = [" ".join(chunk) for chunk in np.split(words, np.cumsum(lengths)[:-1])]
+    if line_breaks:
+        # about one tweet in ten spans several lines, which is what breaks the scraper csv
+        for i in np.flatnonzero(rng.random(n) < 0.1):
+            texts[i] = texts[i].replace(" ", "\n", 1)
+    return texts
+
+def tweet_frame(start, n, rng, line_breaks=False):
+    ids = np.arange(start, start + n)
+    seconds = rng.integers(0, 366 * 24 * 3600, n)
+    datetime = pd.Timestamp("2024-01-01", tz="UTC") + pd.to_timedelta(seconds, unit="s")
+    return pd.DataFrame({
+        "url": [f"https://x.com/user{i % NUM_OFFICIALS}/status/{i}" for i in ids],
+        "datetime": datetime.strftime("%Y-%m-%d %H:%M:%S+00:00"),
+        "content": tweet_texts(n, rng, line_breaks),
+        "likes": rng.integers(0, 50000, n),
+        "retweets": rng.integers(0, 10000, n),
+        "comments": rng.integers(0, 5000, n),
+        "quotes": rng.integers(0, 1000, n),
+        "views": rng.integers(0, 1000000, n),
+        "official_id": (ids % NUM_OFFICIALS).astype(str)
+    })
+
+def chunks(num_rows):
+    for start in range(0, num_rows, CHUNK_ROWS):
+        yield start, min(CHUNK_ROWS, num_rows - start)
+
+def write_broken_scraper_csv(path, num_rows, rng):
+    # the format 00_2024_scraped_data_combiner.py has to repair: content is not quoted,
+    # so it can contain commas and line breaks, and missing metrics are written as NA
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    metrics = ["likes", "retweets", "comments", "quotes", "views"]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("url,datetime,content,likes,retweets,comments,quotes,views\n")
+        for start, n in chunks(num_rows):
+            df = tweet_frame(start, n, rng, line_breaks=True)
+            tail = df[metrics].astype(str).mask(rng.random((n, len(metrics))) < 0.02, "NA")
+            lines = df["url"] + "," + df["datetime"] + "," + df["content"] + "," + tail.agg(",".join, axis=1)
+            f.write("\n".join(lines) + "\n")
+
+def write_combined_csv(path, num_rows, rng):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for start, n in chunks(num_rows):
+        df = tweet_frame(start, n, rng).drop(columns=["official_id"])
+        df.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False, encoding="utf-8")
+
+def write_the_dataset(path, officer_path, num_rows, rng):
+    # the output of 07_clean_data.py, plus the official_data.csv it is joined with in 09_stm_pool.R
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for start, n in chunks(num_rows):
+        df = tweet_frame(start, n, rng)
+        df["predicted_bws_score"] = rng.beta(2, 5, n)
+        df["calendar_week"] = pd.to_datetime(df["datetime"]).dt.isocalendar().week.astype(int).to_numpy()
+        df.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False, encoding="utf-8")
+
+    os.makedirs(os.path.dirname(officer_path), exist_ok=True)
+    pd.DataFrame({
+        "official_id": np.arange(NUM_OFFICIALS).astype(str),
+        "race": rng.choice(["White", "Black", "Latino", "Asian American", "Native American"], NUM_OFFICIALS),
+        "party": rng.choice(["Democratic", "Republican", "Independent"], NUM_OFFICIALS, p=[0.48, 0.48, 0.04])
+    }).to_csv(officer_path, index=False)
+
+def write_bws_tuples(path, num_tuples, rng, labelled=True):
+    # bws_text_data.csv layout, with the labels of 02_openai_label_asynchronism.py when labelled is True
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    texts = np.array(tweet_texts(max(num_tuples * 4 // 15, 4), rng))
+    for start, n in chunks(num_tuples):
+        df = pd.DataFrame({"id": np.arange(start, start + n)})
+        for i in range(4):
+            df[f"text{i+1}"] = texts[rng.integers(0, len(texts), n)]
+        if labelled:
+            order = np.argsort(rng.random((n, 4)), axis=1) + 1
+            df["most_extreme"] = order[:, 0]
+            df["least_extreme"] = order[:, 1]
+        df.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False, encoding="utf-8")